@@ -1,7 +1,28 @@
+import argparse
+
 from processor.base import ExcelProcessor
-from config import LOG_FILE
+from config import LOG_FILE, SERVICE_HOST, SERVICE_PORT, SERVICE_FLUSH_INTERVAL
 
 if __name__ == "__main__":
-    processor = ExcelProcessor()
-    processor.process_all()
-    print(f"\nProcessing complete! Check log file for details: {LOG_FILE}")
+    parser = argparse.ArgumentParser(description="Daily quality report processor")
+    parser.add_argument('--serve', action='store_true',
+                        help="run as a resident ingest service on localhost")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--flush-interval', type=float, default=SERVICE_FLUSH_INTERVAL,
+                        help="seconds between history flushes in service mode")
+    parser.add_argument('--backfill', nargs='+', metavar='REPORT',
+                        help="re-ingest archived daily reports (files or glob patterns) with a single history write")
+    args = parser.parse_args()
+
+    if args.backfill:
+        from processor.backfill import backfill
+        backfill(args.backfill)
+        print(f"\nBackfill complete! Check log file for details: {LOG_FILE}")
+    elif args.serve:
+        from processor.service import run_service
+        run_service(args.host, args.port, args.flush_interval)
+    else:
+        processor = ExcelProcessor()
+        processor.process_all()
+        print(f"\nProcessing complete! Check log file for details: {LOG_FILE}")
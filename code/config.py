@@ -7,3 +7,15 @@ ORIGINAL_FILE = os.path.join(DATA_DIR, "A-INFORME QUÍMICO DIARIO 2025 Macro pru
 UPDATED_FILE = os.path.splitext(ORIGINAL_FILE)[0] + '_updated.xlsx'
 FILTERED_FILE = os.path.splitext(ORIGINAL_FILE)[0] + '_updated_filtered.xlsx'
 LOG_FILE = f'data_processor_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+VIOLATIONS_FILE = os.path.splitext(ORIGINAL_FILE)[0] + '_violations.csv'
+QUARANTINE_INVALID_ROWS = False
+TEMPLATE_PLANS_FILE = os.path.join(DATA_DIR, 'cleaning_plans.json')
+HISTORY_FILE = os.path.join(DATA_DIR, "Data_Ambar Macro Prueba.xlsx")
+HISTORY_UPDATED_FILE = os.path.splitext(HISTORY_FILE)[0] + '_updated.xlsx'
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+SERVICE_FLUSH_INTERVAL = 300  # seconds
+SERVICE_LOCK_FILE = os.path.join(DATA_DIR, 'ingest_service.lock')
+BACKFILL_CHECKPOINT_FILE = os.path.join(DATA_DIR, 'backfill_checkpoint.json')
+BACKFILL_ROWS_DIR = os.path.join(DATA_DIR, 'backfill_rows')  # one pickle per collected report
+BACKFILL_REJECTED_FILE = os.path.join(DATA_DIR, 'backfill_rejected.csv')
@@ -0,0 +1,190 @@
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import glob
+import inspect
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from config import HISTORY_UPDATED_FILE, BACKFILL_CHECKPOINT_FILE, BACKFILL_ROWS_DIR, BACKFILL_REJECTED_FILE
+from logger_config import setup_logger
+from processor.cleaning import clean_daily_excel
+from processor.filtering import filter_columns, FILTERED_SHEET
+from processor.validation import validate_filtered_data
+from processor.transferring import (
+    load_history, map_filtered_rows, merge_history, coerce_history_dtypes, save_history,
+    parse_timestamps, current_history_file, check_no_service
+)
+from processor.utils import report_paths
+
+logger = setup_logger(__name__)
+
+def log_variables(local_vars: Dict[str, Any], exclude: Optional[List[str]] = None) -> None:
+    """Log variable names and their values"""
+    if exclude is None:
+        exclude = []
+    exclude.extend(['self', 'args', 'kwargs', 'exclude'])
+
+    frame = inspect.currentframe().f_back
+    try:
+        for var_name, var_value in frame.f_locals.items():
+            if var_name not in exclude:
+                logger.debug(f"Variable: {var_name} = {var_value!r}")
+    finally:
+        del frame
+
+def expand_reports(patterns: List[str]) -> List[str]:
+    """Expand file names and glob patterns into a sorted, de-duplicated list of reports"""
+    # Skip the intermediate files a previous run wrote next to the reports
+    intermediate_suffixes = tuple(report_paths('').values())
+    reports = set()
+    for pattern in patterns:
+        matches = [match for match in glob.glob(pattern) if not match.endswith(intermediate_suffixes)]
+        if not matches:
+            logger.warning(f"No report files match: {pattern}")
+        reports.update(os.path.abspath(match) for match in matches)
+    return sorted(reports)
+
+def _rows_file(reports: List[str], report: str) -> str:
+    return os.path.join(BACKFILL_ROWS_DIR, f"{reports.index(report):05d}.pkl")
+
+def _load_checkpoint(reports: List[str]) -> Dict[str, Any]:
+    if not os.path.exists(BACKFILL_CHECKPOINT_FILE):
+        return {'reports': reports, 'done': []}
+
+    with open(BACKFILL_CHECKPOINT_FILE, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('reports') != reports:
+        logger.warning("Checkpoint belongs to a different set of reports, starting a new backfill")
+        _clear_checkpoint()
+        return {'reports': reports, 'done': []}
+
+    missing = [report for report in checkpoint['done'] if not os.path.exists(_rows_file(reports, report))]
+    if missing:
+        logger.warning(f"Checkpointed rows are missing for {len(missing)} reports, collecting them again")
+        checkpoint['done'] = [report for report in checkpoint['done'] if report not in missing]
+
+    logger.info(f"Resuming backfill, {len(checkpoint['done'])} of {len(reports)} reports already collected")
+    return checkpoint
+
+def _save_checkpoint(checkpoint: Dict[str, Any], report: str, new_rows: pd.DataFrame) -> None:
+    # Only the new report's rows are written; the rows go first, so a
+    # checkpoint never lists a report whose rows are not on disk
+    os.makedirs(BACKFILL_ROWS_DIR, exist_ok=True)
+    new_rows.to_pickle(_rows_file(checkpoint['reports'], report))
+    checkpoint['done'].append(report)
+    with open(BACKFILL_CHECKPOINT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+
+def _clear_checkpoint() -> None:
+    if os.path.exists(BACKFILL_CHECKPOINT_FILE):
+        os.remove(BACKFILL_CHECKPOINT_FILE)
+    if os.path.isdir(BACKFILL_ROWS_DIR):
+        shutil.rmtree(BACKFILL_ROWS_DIR)
+
+def _collect_report(report: str) -> pd.DataFrame:
+    """Clean, filter and validate one report and return its rows mapped onto the history columns"""
+    paths = report_paths(report)
+    clean_daily_excel(report, paths['updated'])
+    filter_columns(paths['updated'], paths['filtered'])
+    filtered_df = validate_filtered_data(
+        pd.read_excel(paths['filtered'], sheet_name=FILTERED_SHEET), violations_file=paths['violations']
+    )
+
+    return map_filtered_rows(filtered_df).dropna(how='all')
+
+def _quarantine_unparsed(new_rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Force 'Hora de Análisis' to datetime64 and set aside rows whose
+    timestamp does not parse. The column is dropped when no row has a
+    timestamp, so it is not added to the history empty.
+    """
+    unparsed = pd.Series(False, index=new_rows.index)
+    if 'Hora de Análisis' in new_rows.columns:
+        timestamps = parse_timestamps(new_rows['Hora de Análisis'])
+        unparsed = timestamps.isna() & new_rows['Hora de Análisis'].notna()
+
+    if unparsed.any():
+        logger.warning(
+            f"Quarantined {unparsed.sum()} rows with an unparseable 'Hora de Análisis' "
+            f"(e.g. {new_rows['Hora de Análisis'][unparsed].iloc[0]!r}), saved to {BACKFILL_REJECTED_FILE}"
+        )
+        new_rows[unparsed].to_csv(BACKFILL_REJECTED_FILE, index=False, encoding='utf-8-sig')
+    elif os.path.exists(BACKFILL_REJECTED_FILE):
+        os.remove(BACKFILL_REJECTED_FILE)
+
+    if 'Hora de Análisis' not in new_rows.columns:
+        return new_rows
+    new_rows = new_rows[~unparsed].copy()
+    if timestamps[~unparsed].isna().all():
+        return new_rows.drop(columns='Hora de Análisis')
+    new_rows['Hora de Análisis'] = timestamps[~unparsed]
+    return new_rows.sort_values('Hora de Análisis', kind='mergesort', ignore_index=True)
+
+def backfill(patterns: List[str]) -> None:
+    """
+    Re-ingest a range of archived daily reports and rebuild the history
+    with a single merge and a single write.
+
+    Each report is cleaned, filtered and validated, and its mapped rows
+    are checkpointed to their own file, so an interrupted backfill resumes
+    with the next report. Once all reports are collected, rows whose
+    'Hora de Análisis' does not parse are quarantined to
+    BACKFILL_REJECTED_FILE, the rest are sorted by it and merged into the
+    current history, which is then written to HISTORY_UPDATED_FILE once.
+    When no rows were collected the history is not touched. Refuses to
+    run while an ingest service holds the history.
+
+    Args:
+        patterns: Report file names or glob patterns
+    """
+    logger.info("Starting backfill...")
+    log_variables(locals())
+
+    try:
+        check_no_service()
+        reports = expand_reports(patterns)
+        if not reports:
+            logger.warning("No reports to backfill")
+            return
+
+        checkpoint = _load_checkpoint(reports)
+
+        start_time = datetime.now()
+        pending = [report for report in reports if report not in checkpoint['done']]
+        for report in pending:
+            new_rows = _collect_report(report)
+            _save_checkpoint(checkpoint, report, new_rows)
+
+            elapsed = (datetime.now() - start_time).total_seconds()
+            logger.info(
+                f"Backfill progress: {len(checkpoint['done'])}/{len(reports)} reports "
+                f"({os.path.basename(report)}: {len(new_rows)} rows, {elapsed:.1f} s elapsed)"
+            )
+
+        collected = [pd.read_pickle(_rows_file(reports, report)) for report in reports]
+        new_rows = coerce_history_dtypes(pd.concat(collected, ignore_index=True))
+        new_rows = _quarantine_unparsed(new_rows)
+        logger.info(f"Collected {len(new_rows)} rows from {len(reports)} reports")
+
+        if new_rows.empty:
+            logger.info("No rows collected, history left unchanged")
+            _clear_checkpoint()
+            return
+
+        # A service may have started while the reports were collected
+        check_no_service()
+        history_path = current_history_file()
+        logger.info(f"Loading history from {history_path}")
+        history_df = load_history(history_path)
+        history_df = merge_history(history_df, new_rows)
+        save_history(history_df, HISTORY_UPDATED_FILE)
+
+        _clear_checkpoint()
+        logger.info(f"Backfill completed successfully. File saved at: {HISTORY_UPDATED_FILE}")
+
+    except Exception as e:
+        logger.error(f"Error in backfill: {str(e)}", exc_info=True)
+        raise
@@ -1,5 +1,6 @@
 from processor.cleaning import clean_daily_excel
 from processor.filtering import filter_columns
+from processor.validation import validate_filtered_data
 from processor.transferring import transfer_data
 from logger_config import setup_logger
 import inspect
@@ -23,15 +24,21 @@ class ExcelProcessor:
             log_variables(locals())
             
             logger.info("Executing clean_daily_excel()")
-            clean_daily_excel()
+            changes = clean_daily_excel()
             
             logger.info("Executing filter_columns()")
             filter_columns()
             
+            logger.info("Executing validate_filtered_data()")
+            filtered_df = validate_filtered_data()
+            
             logger.info("Executing transfer_data()")
-            transfer_data()
+            transfer_data(filtered_df)
             
-            logger.info("Processing completed successfully!")
+            logger.info(
+                f"Processing completed successfully! Cleaning changed {changes['cells']} cells, "
+                f"{changes['merges']} merged ranges and {changes['widths']} column widths"
+            )
         except Exception as e:
             logger.error(f"Error in process_all: {str(e)}", exc_info=True)
             raise
@@ -1,13 +1,16 @@
 from openpyxl.cell.cell import MergedCell
 from openpyxl.utils import get_column_letter
 from openpyxl import load_workbook
-from typing import List, Any, Dict
-from datetime import datetime, time
+from typing import List, Any, Dict, Tuple, Optional
+from datetime import datetime, time, date
 import inspect
+import os
+import shutil
 
 from config import ORIGINAL_FILE, UPDATED_FILE
 from logger_config import setup_logger
-from processor.utils import parse_time_string, process_time_cells
+from processor.utils import parse_time_string, process_time_cells, parse_header_date
+from processor.templates import fingerprint_template, load_cleaning_plan, save_cleaning_plan, describe_plan
 
 logger = setup_logger(__name__)
 
@@ -25,15 +28,30 @@ def log_variables(local_vars: Dict[str, Any], exclude: List[str] = None) -> None
     finally:
         del frame
 
-def unmerge_columns(ws) -> None:
+def new_change_counts() -> Dict[str, int]:
+    """Counters for the changes the cleaning stage actually makes"""
+    return {'cells': 0, 'merges': 0, 'widths': 0}
+
+def write_cell(cell, value: Any, changes: Dict[str, int]) -> bool:
+    """Assign a cell value only if it differs from the current one"""
+    if cell.value == value and type(cell.value) is type(value):
+        return False
+    cell.value = value
+    changes['cells'] += 1
+    return True
+
+def unmerge_columns(ws, changes: Optional[Dict[str, int]] = None) -> List[str]:
     logger.info("Unmerging cells in range B26 to E31...")
     start_row, end_row = 26, 31
     start_col, end_col = 2, 5
-    log_variables(locals(), ['ws'])
+    log_variables(locals(), ['ws', 'changes'])
+    if changes is None:
+        changes = new_change_counts()
 
     merged_ranges = list(ws.merged_cells.ranges)
     logger.debug(f"Found {len(merged_ranges)} merged ranges in the worksheet")
     
+    unmerged = []
     ranges_unmerged = 0
     for merged_range in merged_ranges:
         if (start_row <= merged_range.min_row <= end_row and
@@ -41,6 +59,7 @@ def unmerge_columns(ws) -> None:
             start_col <= merged_range.min_col <= end_col and
             start_col <= merged_range.max_col <= end_col):
             logger.debug(f"Unmerging range: {merged_range}")
+            unmerged.append(str(merged_range))
             ws.unmerge_cells(str(merged_range))
             ranges_unmerged += 1
     logger.info(f"Unmerged {ranges_unmerged} ranges in B26:E31")
@@ -50,14 +69,21 @@ def unmerge_columns(ws) -> None:
     for merged_range in list(ws.merged_cells.ranges):
         if merged_range.min_col <= 7:
             logger.debug(f"Unmerging range in columns A-G: {merged_range}")
+            unmerged.append(str(merged_range))
             ws.unmerge_cells(str(merged_range))
             ranges_unmerged += 1
     logger.info(f"Unmerged {ranges_unmerged} additional ranges in columns A-G")
+    changes['merges'] += len(unmerged)
+    return unmerged
 
-def set_row_values(ws, values: List[str], start_row: int = 26) -> None:
+def set_row_values(ws, values: List[str], start_row: int = 26,
+                   changes: Optional[Dict[str, int]] = None) -> List[Tuple[str, str]]:
     logger.info(f"Setting values from row {start_row}")
-    log_variables(locals(), ['ws'])
+    log_variables(locals(), ['ws', 'changes'])
+    if changes is None:
+        changes = new_change_counts()
     
+    written = []
     for i, value in enumerate(values, start=start_row):
         cell = ws.cell(row=i, column=2)
         logger.debug(f"Processing row {i}, value: {value}")
@@ -69,18 +95,24 @@ def set_row_values(ws, values: List[str], start_row: int = 26) -> None:
                     logger.debug(f"Found merged range: {merged_range}")
                     target_cell = ws.cell(merged_range.min_row, merged_range.min_col)
                     logger.debug(f"Setting value in merged cell at {target_cell.coordinate}")
-                    target_cell.value = value
-                    logger.info(f"Set merged cell {target_cell.coordinate} to: {value}")
+                    written.append((target_cell.coordinate, value))
+                    if write_cell(target_cell, value, changes):
+                        logger.info(f"Set merged cell {target_cell.coordinate} to: {value}")
                     break
         else:
             logger.debug(f"Setting value in regular cell {cell.coordinate}")
-            cell.value = value
-            logger.info(f"Set cell {cell.coordinate} to: {value}")
+            written.append((cell.coordinate, value))
+            if write_cell(cell, value, changes):
+                logger.info(f"Set cell {cell.coordinate} to: {value}")
+    return written
 
-def move_hora_values(ws) -> None:
+def move_hora_values(ws, changes: Optional[Dict[str, int]] = None) -> List[Tuple[str, str]]:
     logger.info("Moving 'hora' values from column F to column B...")
-    log_variables(locals(), ['ws'])
+    log_variables(locals(), ['ws', 'changes'])
+    if changes is None:
+        changes = new_change_counts()
     
+    moves = []
     rows_processed = 0
     for row in range(1, ws.max_row + 1):
         cell_f = ws.cell(row=row, column=6)
@@ -95,62 +127,72 @@ def move_hora_values(ws) -> None:
                     if cell_b.coordinate in merged_range:
                         target_cell = ws.cell(merged_range.min_row, merged_range.min_col)
                         logger.debug(f"Setting value in merged cell {target_cell.coordinate}")
-                        target_cell.value = cell_f.value
+                        write_cell(target_cell, cell_f.value, changes)
+                        moves.append((cell_f.coordinate, target_cell.coordinate))
                         logger.info(f"Moved 'hora' value from F{row} to merged cell {target_cell.coordinate}")
                         break
             else:
                 logger.debug(f"Setting value in regular cell B{row}")
-                cell_b.value = cell_f.value
+                write_cell(cell_b, cell_f.value, changes)
+                moves.append((cell_f.coordinate, cell_b.coordinate))
                 logger.info(f"Moved 'hora' value from F{row} to B{row}")
                 
-            cell_f.value = None
+            write_cell(cell_f, None, changes)
             rows_processed += 1
     
     logger.info(f"Moved 'hora' values in {rows_processed} rows")
+    return moves
 
-def process_dates(ws, rows_to_update: List[int]) -> None:
+def find_date_columns(ws) -> Dict[int, date]:
     """
-    Process date and time values in the worksheet.
+    Identify date columns in the header row and parse their dates.
     
     Args:
-        ws: Worksheet to process
-        rows_to_update: List of row indices to process (1-based)
+        ws: Worksheet to scan
+        
+    Returns:
+        Dictionary mapping 1-based column index to the column's date
     """
-    logger.info("Processing date/time values from columns G to HH...")
-    log_variables(locals())
+    logger.info("Scanning header row for date columns G to HH...")
     
     date_columns = []
     date_objs = {}
     
-    # First pass: identify date columns and parse dates
     for col in range(7, 209):  # Columns G to HH
         date_cell = ws.cell(row=1, column=col)
         if date_cell.value is None:
             continue
             
-        try:
-            if isinstance(date_cell.value, str):
-                try:
-                    # Parse date string (e.g., "25-Apr-25")
-                    day, month, year = date_cell.value.split('-')
-                    year = f"20{year}"  # Assuming 2-digit year
-                    date_str = f"{day}-{month}-{year}"
-                    date_obj = datetime.strptime(date_str, '%d-%b-%Y')
-                except ValueError:
-                    logger.debug(f"Skipping non-date column {get_column_letter(col)}: {date_cell.value}")
-                    continue
-            else:
-                # Already a date object
-                date_obj = date_cell.value
-                
-            date_columns.append(col)
-            date_objs[col] = date_obj.date()  # Store date part only
-            
-        except Exception as e:
-            logger.error(f"Error processing date in column {get_column_letter(col)}: {e}")
+        date_obj = parse_header_date(date_cell.value)
+        if date_obj is None:
+            logger.debug(f"Skipping non-date column {get_column_letter(col)}: {date_cell.value}")
             continue
+            
+        date_columns.append(col)
+        date_objs[col] = date_obj
     
     logger.info(f"Found {len(date_columns)} date columns to process")
+    return date_objs
+
+def process_dates(ws, rows_to_update: List[int], date_objs: Optional[Dict[int, date]] = None,
+                  changes: Optional[Dict[str, int]] = None) -> None:
+    """
+    Process date and time values in the worksheet.
+    
+    Args:
+        ws: Worksheet to process
+        rows_to_update: List of row indices to process (1-based)
+        date_objs: Date per column from a cleaning plan; scanned from the header when not given
+        changes: Change counters to update
+    """
+    logger.info("Processing date/time values from columns G to HH...")
+    log_variables(locals(), ['ws', 'date_objs', 'changes'])
+    if changes is None:
+        changes = new_change_counts()
+    
+    if date_objs is None:
+        date_objs = find_date_columns(ws)
+    date_columns = list(date_objs)
     
     # Process time values in each date column
     for col in date_columns:
@@ -162,7 +204,7 @@ def process_dates(ws, rows_to_update: List[int]) -> None:
         # Process time values in this column
         time_results = process_time_cells(ws, [col], rows_to_update)
         
-        # Combine dates with times
+        # Combine dates with times; cells that already hold a datetime are left alone
         updates = 0
         for row in rows_to_update:
             cell = ws.cell(row=row, column=col)
@@ -170,57 +212,137 @@ def process_dates(ws, rows_to_update: List[int]) -> None:
                 combined_dt = datetime.combine(date_objs[col], cell.value)
                 cell.value = combined_dt
                 updates += 1
+        changes['cells'] += updates
         
         logger.info(f"Updated {updates} datetime values in column {col_letter}")
     
     logger.info(f"Completed processing of {len(date_columns)} date columns")
 
-def set_column_widths(ws) -> None:
+def set_column_widths(ws, changes: Optional[Dict[str, int]] = None) -> None:
     logger.info("Setting column widths from C to HH...")
-    log_variables(locals(), ['ws'])
+    log_variables(locals(), ['ws', 'changes'])
+    if changes is None:
+        changes = new_change_counts()
     
     columns_updated = 0
     for col in range(3, 209):
         col_letter = get_column_letter(col)
         try:
-            ws.column_dimensions[col_letter].width = 15
+            dimension = ws.column_dimensions[col_letter]
+            if dimension.width == 15:
+                continue
+            dimension.width = 15
             columns_updated += 1
         except Exception as e:
             logger.error(f"Error setting width for column {col_letter}: {e}")
     
+    changes['widths'] += columns_updated
     logger.info(f"Updated width for {columns_updated} columns")
 
-def clean_daily_excel() -> None:
-    logger.info(f"Cleaning Excel file: {ORIGINAL_FILE}")
+def apply_cleaning_plan(ws, plan: Dict[str, Any], changes: Optional[Dict[str, int]] = None) -> None:
+    """
+    Run a cached cleaning plan against a worksheet, touching only the
+    cell addresses recorded in the plan.
+    
+    Args:
+        ws: Worksheet whose template fingerprint matches the plan
+        plan: Plan produced by a previous discovery run
+        changes: Change counters to update
+    """
+    logger.info(f"Applying cleaning plan: {describe_plan(plan)}")
+    log_variables(locals(), ['ws', 'plan', 'changes'])
+    if changes is None:
+        changes = new_change_counts()
+    
+    for merged_range in plan['unmerge_ranges']:
+        ws.unmerge_cells(merged_range)
+    changes['merges'] += len(plan['unmerge_ranges'])
+    logger.info(f"Unmerged {len(plan['unmerge_ranges'])} ranges")
+    
+    labels_set = sum(write_cell(ws[coordinate], value, changes) for coordinate, value in plan['row_values'])
+    logger.info(f"Set {labels_set} of {len(plan['row_values'])} label cells")
+    
+    for source, target in plan['hora_moves']:
+        if ws[source].value is None:
+            continue
+        write_cell(ws[target], ws[source].value, changes)
+        write_cell(ws[source], None, changes)
+    logger.info(f"Moved 'hora' values in {len(plan['hora_moves'])} rows")
+    
+    # Dates are report data, so they are read from the header at replay time
+    date_objs = {col: parse_header_date(ws.cell(row=1, column=col).value) for col in plan['date_columns']}
+    process_dates(ws, plan['time_rows'], date_objs, changes)
+    
+    set_column_widths(ws, changes)
+
+def clean_daily_excel(source_file: str = ORIGINAL_FILE, updated_file: str = UPDATED_FILE) -> Dict[str, int]:
+    """
+    Clean a daily report and write it to updated_file.
+    
+    Only real changes are made and counted. When nothing changed the
+    workbook is not re-serialized; the source file is copied as is.
+    
+    Returns:
+        Counts of changed cells, unmerged ranges and column widths
+    """
+    logger.info(f"Cleaning Excel file: {source_file}")
     log_variables(locals())
     
     try:
-        logger.debug(f"Loading workbook from {ORIGINAL_FILE}")
-        wb = load_workbook(filename=ORIGINAL_FILE)
+        logger.debug(f"Loading workbook from {source_file}")
+        wb = load_workbook(filename=source_file)
         ws = wb.active
         logger.info(f"Active worksheet: {ws.title}")
 
-        values_to_set = [
-            "Semillas L593", "Semillas L594", "Semillas (0 - 0,5) mm L 593",
-            "Semillas (0 - 0,5) mm L 594", "Burbujas (0,5-1) mm L 593",
-            "Burbujas (0,5-1) mm L 594", "Burbujas (>1)mm L 593", "Burbujas (>1)mm L 594"
-        ]
-        logger.debug(f"Values to set: {values_to_set}")
-
-        logger.info("Starting worksheet processing...")
-        unmerge_columns(ws)
-        set_row_values(ws, values_to_set)
-        move_hora_values(ws)
-        
-        rows_to_update = list(range(26, 34))
-        logger.debug(f"Will update date/time in rows: {rows_to_update}")
-        process_dates(ws, rows_to_update)
+        changes = new_change_counts()
+        fingerprint = fingerprint_template(ws)
+        plan = load_cleaning_plan(fingerprint)
         
-        set_column_widths(ws)
+        if plan is not None:
+            apply_cleaning_plan(ws, plan, changes)
+        else:
+            values_to_set = [
+                "Semillas L593", "Semillas L594", "Semillas (0 - 0,5) mm L 593",
+                "Semillas (0 - 0,5) mm L 594", "Burbujas (0,5-1) mm L 593",
+                "Burbujas (0,5-1) mm L 594", "Burbujas (>1)mm L 593", "Burbujas (>1)mm L 594"
+            ]
+            logger.debug(f"Values to set: {values_to_set}")
+
+            logger.info("Starting worksheet processing with layout discovery...")
+            unmerge_ranges = unmerge_columns(ws, changes)
+            row_values = set_row_values(ws, values_to_set, changes=changes)
+            hora_moves = move_hora_values(ws, changes)
+            
+            rows_to_update = list(range(26, 34))
+            logger.debug(f"Will update date/time in rows: {rows_to_update}")
+            date_objs = find_date_columns(ws)
+            process_dates(ws, rows_to_update, date_objs, changes)
+            
+            set_column_widths(ws, changes)
+            
+            save_cleaning_plan(fingerprint, {
+                'unmerge_ranges': unmerge_ranges,
+                'row_values': row_values,
+                'hora_moves': hora_moves,
+                'time_rows': rows_to_update,
+                'date_columns': list(date_objs),
+            })
+
+        logger.info(
+            f"Cleaning changed {changes['cells']} cells, unmerged {changes['merges']} ranges, "
+            f"resized {changes['widths']} columns"
+        )
+        if not any(changes.values()):
+            logger.info("Report is already clean, skipping workbook save")
+            if os.path.abspath(source_file) != os.path.abspath(updated_file):
+                shutil.copy2(source_file, updated_file)
+                logger.info(f"Copied unchanged report to: {updated_file}")
+            return changes
 
-        logger.info(f"Saving cleaned workbook to {UPDATED_FILE}")
-        wb.save(UPDATED_FILE)
-        logger.info(f"Successfully saved cleaned Excel to: {UPDATED_FILE}")
+        logger.info(f"Saving cleaned workbook to {updated_file}")
+        wb.save(updated_file)
+        logger.info(f"Successfully saved cleaned Excel to: {updated_file}")
+        return changes
         
     except Exception as e:
         logger.error(f"Error in clean_daily_excel: {str(e)}", exc_info=True)
@@ -8,6 +8,8 @@ from logger_config import setup_logger
 
 logger = setup_logger(__name__)
 
+FILTERED_SHEET = "Filtered"
+
 def log_variables(local_vars: Dict[str, Any], exclude: List[str] = None) -> None:
     """Log variable names and their values"""
     if exclude is None:
@@ -22,18 +24,18 @@ def log_variables(local_vars: Dict[str, Any], exclude: List[str] = None) -> None
     finally:
         del frame
 
-def filter_columns() -> None:
+def filter_columns(updated_file: str = UPDATED_FILE, filtered_file: str = FILTERED_FILE) -> None:
     logger.info("Filtering columns to create filtered sheet")
     log_variables(locals())
     
     try:
-        logger.info(f"Loading workbook from {UPDATED_FILE}")
-        wb = load_workbook(filename=UPDATED_FILE)
+        logger.info(f"Loading workbook from {updated_file}")
+        wb = load_workbook(filename=updated_file)
         ws = wb.active
         logger.info(f"Active worksheet: {ws.title}, Rows: {ws.max_row}, Columns: {ws.max_column}")
         
-        logger.info("Creating 'Filtered' worksheet")
-        filtered_ws = wb.create_sheet(title="Filtered")
+        logger.info(f"Creating '{FILTERED_SHEET}' worksheet")
+        filtered_ws = wb.create_sheet(title=FILTERED_SHEET)
         
         columns_to_keep = [
             "columna en informe diario", "Hora de Análisis", "Saturación (%) (Pureza)",
@@ -81,9 +83,9 @@ def filter_columns() -> None:
         if columns_not_found:
             logger.warning(f"Columns not found: {', '.join(columns_not_found)}")
         
-        logger.info(f"Saving filtered workbook to {FILTERED_FILE}")
-        wb.save(FILTERED_FILE)
-        logger.info(f"Successfully saved filtered sheet to: {FILTERED_FILE}")
+        logger.info(f"Saving filtered workbook to {filtered_file}")
+        wb.save(filtered_file)
+        logger.info(f"Successfully saved filtered sheet to: {filtered_file}")
         
     except Exception as e:
         logger.error(f"Error in filter_columns: {str(e)}", exc_info=True)
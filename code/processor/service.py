@@ -0,0 +1,226 @@
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import inspect
+import json
+import os
+import signal
+import threading
+
+import pandas as pd
+
+from config import (
+    HISTORY_UPDATED_FILE, SERVICE_HOST, SERVICE_PORT, SERVICE_FLUSH_INTERVAL, SERVICE_LOCK_FILE
+)
+from logger_config import setup_logger
+from processor.cleaning import clean_daily_excel
+from processor.filtering import filter_columns, FILTERED_SHEET
+from processor.validation import validate_filtered_data
+from processor.transferring import (
+    load_history, append_filtered_rows, save_history, current_history_file, service_lock_holder
+)
+from processor.utils import report_paths
+
+logger = setup_logger(__name__)
+
+def log_variables(local_vars: Dict[str, Any], exclude: Optional[List[str]] = None) -> None:
+    """Log variable names and their values"""
+    if exclude is None:
+        exclude = []
+    exclude.extend(['self', 'args', 'kwargs', 'exclude'])
+
+    frame = inspect.currentframe().f_back
+    try:
+        for var_name, var_value in frame.f_locals.items():
+            if var_name not in exclude:
+                logger.debug(f"Variable: {var_name} = {var_value!r}")
+    finally:
+        del frame
+
+def acquire_service_lock(host: str, port: int) -> None:
+    """Record that a service holds the history, so backfills and normal runs do not overwrite it"""
+    holder = service_lock_holder()
+    if holder is not None:
+        raise RuntimeError(
+            f"Another ingest service (pid {holder.get('pid')}, {holder.get('address')}) holds the history; "
+            f"remove {SERVICE_LOCK_FILE} if it is no longer running"
+        )
+    with open(SERVICE_LOCK_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            'pid': os.getpid(), 'address': f"{host}:{port}", 'started': datetime.now().isoformat()
+        }, f)
+
+def release_service_lock() -> None:
+    if os.path.exists(SERVICE_LOCK_FILE):
+        os.remove(SERVICE_LOCK_FILE)
+
+class IngestService:
+    """
+    Resident ingest pipeline that keeps the parsed history in memory.
+
+    Each ingested report runs clean -> filter -> validate and its rows are
+    appended to the in-memory history. The history is written to
+    HISTORY_UPDATED_FILE every flush_interval seconds when it has changed,
+    and on shutdown.
+    """
+
+    def __init__(self, flush_interval: float = SERVICE_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.reports_ingested = 0
+        self.last_flush: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+        # Continue from our own output when it exists so restarts keep earlier ingests
+        history_path = current_history_file()
+        logger.info(f"Loading history from {history_path}")
+        self.history_df = load_history(history_path)
+        logger.info(f"History loaded with {len(self.history_df)} rows")
+
+    def ingest(self, report_file: str) -> Dict[str, Any]:
+        logger.info(f"Ingesting report: {report_file}")
+        log_variables(locals())
+
+        start_time = datetime.now()
+        paths = report_paths(report_file)
+        changes = clean_daily_excel(report_file, paths['updated'])
+        filter_columns(paths['updated'], paths['filtered'])
+        filtered_df = validate_filtered_data(
+            pd.read_excel(paths['filtered'], sheet_name=FILTERED_SHEET), violations_file=paths['violations']
+        )
+
+        with self.lock:
+            rows_before = len(self.history_df)
+            self.history_df = append_filtered_rows(self.history_df, filtered_df)
+            rows_added = len(self.history_df) - rows_before
+            # A report without rows leaves the history as it was, so it does not need a flush
+            self.dirty = self.dirty or rows_added > 0
+            self.reports_ingested += 1
+
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"Ingested {report_file} in {duration:.2f} seconds, added {rows_added} rows")
+        return {
+            'report': report_file, 'rows_added': rows_added,
+            'cells_changed': changes['cells'], 'seconds': round(duration, 3)
+        }
+
+    def flush(self) -> bool:
+        """Write the history to disk if it changed since the last flush"""
+        with self.lock:
+            if not self.dirty:
+                logger.debug("History unchanged, nothing to flush")
+                return False
+            save_history(self.history_df, HISTORY_UPDATED_FILE)
+            self.dirty = False
+            self.last_flush = datetime.now()
+        logger.info(f"Flushed {len(self.history_df)} history rows to {HISTORY_UPDATED_FILE}")
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'history_rows': len(self.history_df),
+            'reports_ingested': self.reports_ingested,
+            'dirty': self.dirty,
+            'last_flush': self.last_flush.isoformat() if self.last_flush else None,
+        }
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error in periodic flush: {str(e)}", exc_info=True)
+
+    def start(self) -> None:
+        if self.flush_interval and self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name='history-flush', daemon=True)
+            self._flusher.start()
+            logger.info(f"Flushing history every {self.flush_interval} seconds")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+class IngestRequestHandler(BaseHTTPRequestHandler):
+    """
+    Localhost HTTP endpoints:
+        POST /ingest  {"path": "<daily report .xlsx>"}
+        POST /flush
+        GET  /status
+    """
+    service: IngestService = None
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == '/status':
+            self._send_json(200, self.service.status())
+        else:
+            self._send_json(404, {'error': f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self) -> None:
+        try:
+            if self.path == '/ingest':
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                report_file = request.get('path')
+                if not report_file or not os.path.exists(report_file):
+                    self._send_json(400, {'error': f"Report file not found: {report_file}"})
+                    return
+                self._send_json(200, self.service.ingest(report_file))
+            elif self.path == '/flush':
+                self._send_json(200, {'flushed': self.service.flush()})
+            else:
+                self._send_json(404, {'error': f"Unknown endpoint: {self.path}"})
+        except Exception as e:
+            logger.error(f"Error handling {self.path}: {str(e)}", exc_info=True)
+            self._send_json(500, {'error': str(e)})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.info(f"{self.address_string()} - {format % args}")
+
+def run_service(host: str = SERVICE_HOST, port: int = SERVICE_PORT,
+                flush_interval: float = SERVICE_FLUSH_INTERVAL) -> None:
+    """Serve ingest requests until interrupted or terminated, then flush the history"""
+    logger.info("Starting ingest service...")
+    log_variables(locals())
+
+    # Take the lock before loading, so no backfill or normal run can write behind the loaded history
+    acquire_service_lock(host, port)
+    try:
+        service = IngestService(flush_interval)
+        IngestRequestHandler.service = service
+        server = HTTPServer((host, port), IngestRequestHandler)
+
+        def request_shutdown(signum: int, frame: Any) -> None:
+            logger.info(f"Received signal {signum}, shutting down")
+            # shutdown() blocks until serve_forever() returns, so it cannot run on the serving thread
+            threading.Thread(target=server.shutdown, name='service-shutdown').start()
+
+        signal.signal(signal.SIGTERM, request_shutdown)
+        if hasattr(signal, 'SIGBREAK'):  # Ctrl+Break / service stop on Windows
+            signal.signal(signal.SIGBREAK, request_shutdown)
+
+        service.start()
+        logger.info(f"Ingest service listening on http://{host}:{port}")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Shutdown requested")
+        finally:
+            server.server_close()
+            service.stop()
+            logger.info("Ingest service stopped")
+    finally:
+        release_service_lock()
@@ -0,0 +1,119 @@
+from openpyxl.utils import get_column_letter
+from typing import Dict, Any, List, Optional
+import hashlib
+import inspect
+import json
+import os
+
+from config import TEMPLATE_PLANS_FILE
+from logger_config import setup_logger
+from processor.utils import parse_header_date
+
+logger = setup_logger(__name__)
+
+# Bump when the plan layout changes so old plans are not reused
+PLAN_VERSION = 2
+
+HEADER_COLUMNS = range(1, 209)  # Columns A to HH
+DATE_HEADER_MIN_COL = 7  # Header cells from column G hold the report dates
+LABEL_COLUMNS = (2, 6)  # Columns B and F
+LABEL_MAX_ROW = 100  # Daily report label band; templates are under 90 rows
+MERGED_MAX_COL = 7  # Merged ranges starting in columns A-G are unmerged by cleaning
+
+_plans: Optional[Dict[str, Dict[str, Any]]] = None
+
+def log_variables(local_vars: Dict[str, Any], exclude: List[str] = None) -> None:
+    """Log variable names and their values"""
+    if exclude is None:
+        exclude = []
+    exclude.extend(['self', 'args', 'kwargs', 'exclude'])
+
+    frame = inspect.currentframe().f_back
+    try:
+        for var_name, var_value in frame.f_locals.items():
+            if var_name not in exclude:
+                logger.debug(f"Variable: {var_name} = {var_value!r}")
+    finally:
+        del frame
+
+def _cell_text(value: Any) -> str:
+    return '' if value is None else str(value).strip()
+
+def _header_signature(col: int, value: Any) -> str:
+    # Date cells only contribute their position, so reports for other days share a template
+    if col >= DATE_HEADER_MIN_COL and parse_header_date(value) is not None:
+        return '<date>'
+    return _cell_text(value)
+
+def fingerprint_template(ws) -> str:
+    """
+    Fingerprint a daily report layout from its header row, label cells
+    and merged-range signature. Header dates are reduced to "is a date",
+    so the fingerprint does not change with the report's date window.
+
+    Args:
+        ws: Worksheet to fingerprint, before any cleaning is applied
+
+    Returns:
+        Hex digest identifying the template
+    """
+    log_variables(locals(), ['ws'])
+
+    header = [_header_signature(col, ws.cell(row=1, column=col).value) for col in HEADER_COLUMNS]
+
+    min_col, max_col = min(LABEL_COLUMNS), max(LABEL_COLUMNS)
+    labels = [
+        [_cell_text(row[col - min_col]) for col in LABEL_COLUMNS]
+        for row in ws.iter_rows(min_row=1, max_row=LABEL_MAX_ROW, min_col=min_col, max_col=max_col,
+                                values_only=True)
+    ]
+
+    merged = sorted(str(r) for r in ws.merged_cells.ranges if r.min_col <= MERGED_MAX_COL)
+
+    payload = json.dumps({
+        'version': PLAN_VERSION,
+        'title': ws.title,
+        'header': header,
+        'labels': labels,
+        'merged': merged,
+    }, ensure_ascii=False)
+    fingerprint = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    logger.info(f"Template fingerprint for '{ws.title}': {fingerprint}")
+    return fingerprint
+
+def _load_plans() -> Dict[str, Dict[str, Any]]:
+    global _plans
+    if _plans is None:
+        if os.path.exists(TEMPLATE_PLANS_FILE):
+            logger.debug(f"Loading cleaning plans from {TEMPLATE_PLANS_FILE}")
+            with open(TEMPLATE_PLANS_FILE, encoding='utf-8') as f:
+                _plans = json.load(f)
+        else:
+            _plans = {}
+    return _plans
+
+def load_cleaning_plan(fingerprint: str) -> Optional[Dict[str, Any]]:
+    """Return the registered cleaning plan for a fingerprint, if any"""
+    plan = _load_plans().get(fingerprint)
+    if plan is None:
+        logger.info(f"No cleaning plan registered for template {fingerprint}")
+    else:
+        logger.info(f"Using cached cleaning plan for template {fingerprint}")
+    return plan
+
+def save_cleaning_plan(fingerprint: str, plan: Dict[str, Any]) -> None:
+    """Register a cleaning plan and persist all plans to TEMPLATE_PLANS_FILE"""
+    plans = _load_plans()
+    plans[fingerprint] = plan
+    logger.info(f"Saving cleaning plan for template {fingerprint} to {TEMPLATE_PLANS_FILE}")
+    with open(TEMPLATE_PLANS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(plans, f, ensure_ascii=False, indent=2)
+
+def describe_plan(plan: Dict[str, Any]) -> str:
+    """Short summary of a cleaning plan for logging"""
+    date_cols = plan['date_columns']
+    date_span = f"{get_column_letter(min(date_cols))}:{get_column_letter(max(date_cols))}" if date_cols else "none"
+    return (
+        f"{len(plan['unmerge_ranges'])} unmerges, {len(plan['row_values'])} labels, "
+        f"{len(plan['hora_moves'])} hora moves, {len(date_cols)} date columns ({date_span})"
+    )
@@ -1,15 +1,61 @@
 import pandas as pd
-import os
-import shutil
+from datetime import date, time
 from typing import Dict, Any, List, Optional
 import inspect
+import json
+import os
 
-from config import BASE_DIR, FILTERED_FILE
+from config import FILTERED_FILE, HISTORY_FILE, HISTORY_UPDATED_FILE, SERVICE_LOCK_FILE
 from logger_config import setup_logger
-from processor.utils import format_datetime
+from processor.filtering import FILTERED_SHEET
 
 logger = setup_logger(__name__)
 
+COLUMN_MAPPING = {
+    'Hora de Análisis': 'Hora de Análisis', 
+    'Saturación (%) (Pureza)': 'Pureza',
+    'Longitud de onda (nm)': 'DWL', 
+    'L*': 'L', 
+    'a*': 'a', 
+    'b*': 'b',
+    'Densidad': 'Densidad', 
+    '% T 550 (2mm)': '%T 550nm (2mm)',
+    'Semillas L593': 'Semillas L593', 
+    'Semillas L594': 'Semillas L594',
+    'Semillas (0 - 0,5) mm L 593': 'Semillas (0 - 0,5) mm L 593',
+    'Semillas (0 - 0,5) mm L 594': 'Semillas (0 - 0,5) mm L 594',
+    'Burbujas (0,5-1) mm L 593': 'Burbujas (0,5-1) mm L 593',
+    'Burbujas (0,5-1) mm L 594': 'Burbujas (0,5-1) mm L 594',
+    'Burbujas (>1)mm L 593': 'Burbujas (>1)mm L 593',
+    'Burbujas (>1)mm L 594': 'Burbujas (>1)mm L 594',
+    'Burbujas por Kg - 593': 'Burbujas L993/kg', 
+    'Burbujas por Kg - 594': 'Burbujas L994/kg',
+    'SiO2': 'SiO2', 
+    'Na2O': 'Na2O', 
+    'CaO': 'CaO', 
+    'MgO': 'MgO', 
+    'Al2O3': 'Al2O3',
+    'K2O': 'K2O', 
+    'SO3': 'SO3', 
+    'Fe2O3': 'Fe2O3', 
+    'TiO2': 'TiO2',
+    'SiO2D (100-S(ox))': 'SiO2D (100-S(ox))', 
+    'Cr2O3': 'Cr2O3',
+    '%FeO as Fe2O3': 'FeO', 
+    'Redox': 'Redox', 
+    'Viscosidad (°C)': 'Viscosidad (°C)',
+    'Cooling Time (s)': 'Cooling Time (s)'
+}
+
+HISTORY_SHEET_NAMES = ['datos', 'data', 'datos sheet', 'hoja datos']
+
+# In-memory dtypes for the history; see coerce_history_dtypes()
+TIMESTAMP_COLUMNS = ['Hora de Análisis', ' Date']
+COUNT_COLUMN_PREFIXES = ('Semillas', 'Burbujas', 'Fast Countig')
+DISPLAY_DATETIME_FORMAT = '%d/%m/%Y %H:%M:%S'
+TIME_NUMBER_FORMAT = 'h:mm:ss'
+CATEGORY_MAX_RATIO = 0.5  # Object columns with fewer unique values than this share become categoricals
+
 def log_variables(local_vars: Dict[str, Any], exclude: Optional[List[str]] = None) -> None:
     """Log variable names and their values"""
     if exclude is None:
@@ -24,115 +70,328 @@ def log_variables(local_vars: Dict[str, Any], exclude: Optional[List[str]] = Non
     finally:
         del frame
 
-def transfer_data() -> None:
-    logger.info("Starting data transfer from filtered to source file...")
-    log_variables(locals())
+def _keep_if_lossless(original: pd.Series, converted: pd.Series) -> pd.Series:
+    """Use the converted column only if it did not turn any value into NA"""
+    lost = converted.isna() & original.notna()
+    if lost.any():
+        logger.warning(f"Keeping column '{original.name}' as is, {lost.sum()} values would not convert")
+        return original
+    return converted
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """Vectorized counterpart of format_datetime() that returns datetime64 values"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    parsed = pd.to_datetime(values, format=DISPLAY_DATETIME_FORMAT, errors='coerce')
+    remaining = parsed.isna() & values.notna()
+    if remaining.any():
+        parsed[remaining] = pd.to_datetime(values[remaining], format='mixed', dayfirst=True, errors='coerce')
+    return parsed
+
+def _compact_numeric(values: pd.Series, is_count: bool) -> pd.Series:
+    numeric = pd.to_numeric(values, errors='coerce')
+    if is_count:
+        present = numeric.dropna()
+        if ((present % 1 == 0) & (present >= 0) & (present <= 65535)).all():
+            return numeric.astype('UInt16')
+    compact = numeric.astype('float32')
+    # to_export_frame() widens float32 through its shortest repr; only use float32
+    # when that gives back every stored value, so saving never truncates the history
+    restored = pd.to_numeric(compact.astype(str), errors='coerce')
+    if not ((restored == numeric) | numeric.isna()).all():
+        logger.debug(f"Keeping column '{values.name}' as float64, float32 would round its values")
+        return numeric.astype('float64')
+    return compact
+
+def _parse_numbers(values: pd.Series) -> pd.Series:
+    """Numbers of a column that may hold text with decimal commas (e.g. '38,146\\n'), NaN where not a number"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    text = values.map(lambda value: value.strip().replace(',', '.') if isinstance(value, str) else value)
+    return pd.to_numeric(text, errors='coerce')
+
+def _holds_temporal(values: pd.Series) -> bool:
+    """True if an object column holds time/date objects (e.g. the history 'Hora' column)"""
+    return values.dropna().map(lambda value: isinstance(value, (time, date))).any()
+
+def coerce_history_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the history into compact dtypes: datetime64 timestamps, float32
+    measurements, small integers for whole-number seed/bubble counts and
+    categoricals for repeated labels. Numbers stored as text with a
+    decimal comma are parsed as numbers.
     
-    try:
-        # Define column mapping with detailed logging
-        column_mapping = {
-            'Hora de Análisis': 'Hora de Análisis', 
-            'Saturación (%) (Pureza)': 'Pureza',
-            'Longitud de onda (nm)': 'DWL', 
-            'L*': 'L', 
-            'a*': 'a', 
-            'b*': 'b',
-            'Densidad': 'Densidad', 
-            '% T 550 (2mm)': '%T 550nm (2mm)',
-            'Semillas L593': 'Semillas L593', 
-            'Semillas L594': 'Semillas L594',
-            'Semillas (0 - 0,5) mm L 593': 'Semillas (0 - 0,5) mm L 593',
-            'Semillas (0 - 0,5) mm L 594': 'Semillas (0 - 0,5) mm L 594',
-            'Burbujas (0,5-1) mm L 593': 'Burbujas (0,5-1) mm L 593',
-            'Burbujas (0,5-1) mm L 594': 'Burbujas (0,5-1) mm L 594',
-            'Burbujas (>1)mm L 593': 'Burbujas (>1)mm L 593',
-            'Burbujas (>1)mm L 594': 'Burbujas (>1)mm L 594',
-            'Burbujas por Kg - 593': 'Burbujas L993/kg', 
-            'Burbujas por Kg - 594': 'Burbujas L994/kg',
-            'SiO2': 'SiO2', 
-            'Na2O': 'Na2O', 
-            'CaO': 'CaO', 
-            'MgO': 'MgO', 
-            'Al2O3': 'Al2O3',
-            'K2O': 'K2O', 
-            'SO3': 'SO3', 
-            'Fe2O3': 'Fe2O3', 
-            'TiO2': 'TiO2',
-            'SiO2D (100-S(ox))': 'SiO2D (100-S(ox))', 
-            'Cr2O3': 'Cr2O3',
-            '%FeO as Fe2O3': 'FeO', 
-            'Redox': 'Redox', 
-            'Viscosidad (°C)': 'Viscosidad (°C)',
-            'Cooling Time (s)': 'Cooling Time (s)'
-        }
-        logger.debug(f"Column mapping: {column_mapping}")
+    Values are never rounded. Only measurements that float32 holds exactly
+    (e.g. the oxide analyses) become float32; computed columns with full
+    double precision (Pureza, DWL, L/a/b, Densidad, %T 550nm, FeO, Redox,
+    Viscosidad, Cooling Time and the Semillas/Burbujas rates in the real
+    history) stay float64. Columns of
+    time/date objects stay object so they are written back as Excel times.
+    
+    Args:
+        df: History or new rows as read from Excel
         
-        # Set up source and destination paths
-        source_path = os.path.join(BASE_DIR, "data", "Data_Ambar Macro Prueba.xlsx")
-        updated_path = os.path.splitext(source_path)[0] + '_updated.xlsx'
-        logger.info(f"Source file: {source_path}")
-        logger.info(f"Destination file: {updated_path}")
+    Returns:
+        Dataframe with compact dtypes
+    """
+    memory_before = df.memory_usage(deep=True).sum()
+    df = df.copy()
+    
+    for col in df.columns:
+        values = df[col]
+        if col in TIMESTAMP_COLUMNS:
+            df[col] = _keep_if_lossless(values, parse_timestamps(values))
+        elif pd.api.types.is_bool_dtype(values) or (values.dtype == object and _holds_temporal(values)):
+            continue
+        elif (_parse_numbers(values).notna() | values.isna()).all():
+            is_count = str(col).startswith(COUNT_COLUMN_PREFIXES)
+            df[col] = _keep_if_lossless(values, _compact_numeric(_parse_numbers(values), is_count))
+        elif values.nunique() < CATEGORY_MAX_RATIO * len(values):
+            df[col] = values.astype('category')
+    
+    memory_after = df.memory_usage(deep=True).sum()
+    logger.info(f"History memory: {memory_before / 1024:.0f} KiB -> {memory_after / 1024:.0f} KiB")
+    return df
+
+def to_export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the compact history back to the values written to Excel.
+    'Hora de Análisis' becomes the usual display string and float32
+    columns are widened using their shortest representation so no
+    float32 rounding noise ends up in the workbook. Only columns that
+    float32 holds exactly are float32 (see _compact_numeric()), so the
+    exported values are the ones that were loaded.
+    """
+    df = df.copy()
+    for col in df.columns:
+        values = df[col]
+        if col == 'Hora de Análisis' and pd.api.types.is_datetime64_any_dtype(values):
+            df[col] = values.dt.strftime(DISPLAY_DATETIME_FORMAT)
+        elif values.dtype == 'float32':
+            df[col] = pd.to_numeric(values.astype(str), errors='coerce')
+    return df
+
+def load_history(path: str) -> pd.DataFrame:
+    """
+    Read the quality history from the data sheet of a workbook.
+    
+    Args:
+        path: History workbook path
+        
+    Returns:
+        History dataframe with fully empty rows dropped
+    """
+    # Find the correct sheet in the destination file
+    logger.info("Searching for the correct sheet in the destination file...")
+    with pd.ExcelFile(path) as xls:
+        sheet_found = False
+        for sheet in xls.sheet_names:
+            if sheet.lower() in HISTORY_SHEET_NAMES:
+                logger.info(f"Found target sheet: {sheet}")
+                history_df = pd.read_excel(xls, sheet_name=sheet)
+                sheet_found = True
+                break
+        
+        if not sheet_found:
+            logger.warning("No matching sheet found, using first sheet")
+            history_df = pd.read_excel(xls)
+    
+    logger.info(f"Original data shape before processing: {history_df.shape}")
+    
+    # Clean up the dataframe
+    initial_rows = len(history_df)
+    history_df = history_df.dropna(how='all')
+    logger.info(f"Dropped {initial_rows - len(history_df)} empty rows from original data")
+    return coerce_history_dtypes(history_df)
+
+def map_filtered_rows(filtered_df: pd.DataFrame) -> pd.DataFrame:
+    """Rename filtered report columns to their history names, in compact dtypes"""
+    source_cols = [col for col in COLUMN_MAPPING if col in filtered_df.columns]
+    new_rows = filtered_df[source_cols].rename(columns=COLUMN_MAPPING).reset_index(drop=True)
+    return coerce_history_dtypes(new_rows)
+
+def _concat_history(history_df: pd.DataFrame, new_rows: pd.DataFrame) -> pd.DataFrame:
+    old_dtypes = history_df.dtypes
+    history_df = pd.concat([history_df, new_rows], ignore_index=True)
+    # concat widens columns whose dtypes differ (e.g. categories, UInt16 vs float32)
+    widened = [col for col in new_rows.columns if col in old_dtypes and history_df[col].dtype != old_dtypes[col]]
+    if widened:
+        history_df[widened] = coerce_history_dtypes(history_df[widened])
+    return history_df
+
+def append_filtered_rows(history_df: pd.DataFrame, filtered_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Map filtered report rows onto the history columns and append them.
+    
+    Args:
+        history_df: Current history
+        filtered_df: Filtered (and validated) report rows
         
-        # Create a backup of the source file
-        logger.info("Creating backup of source file...")
-        shutil.copy2(source_path, updated_path)
-        logger.info(f"Backup created at: {updated_path}")
-
-        # Read filtered data
-        logger.info(f"Reading filtered data from: {FILTERED_FILE}")
-        filtered_df = pd.read_excel(FILTERED_FILE)
-        logger.info(f"Read {len(filtered_df)} rows from filtered data")
+    Returns:
+        New history dataframe including the appended rows
+    """
+    logger.info("Processing filtered data rows...")
+    new_rows = map_filtered_rows(filtered_df)
+    history_df = _concat_history(history_df, new_rows)
+    
+    logger.info(f"Added {len(new_rows)} new rows to the data")
+    logger.info(f"Final data shape: {history_df.shape}")
+    return history_df
+
+def analysis_timestamps(df: pd.DataFrame) -> pd.Series:
+    """
+    Timestamp identifying each analysis, used to match rows across reports.
+    
+    Rows ingested from reports carry 'Hora de Análisis'; rows of the
+    original Datos sheet only have ' Date' and 'Hora', which are combined.
+    Values that do not parse become NaT instead of raising.
+    
+    Args:
+        df: History and/or mapped report rows
         
-        # Find the correct sheet in the destination file
-        logger.info("Searching for the correct sheet in the destination file...")
-        with pd.ExcelFile(updated_path) as xls:
-            sheet_found = False
-            for sheet in xls.sheet_names:
-                if sheet.lower() in ['datos', 'data', 'datos sheet', 'hoja datos']:
-                    logger.info(f"Found target sheet: {sheet}")
-                    updated_df = pd.read_excel(updated_path, sheet_name=sheet)
-                    sheet_found = True
-                    break
-            
-            if not sheet_found:
-                logger.warning("No matching sheet found, using first sheet")
-                updated_df = pd.read_excel(updated_path)
+    Returns:
+        datetime64 series aligned with df
+    """
+    key = pd.Series(pd.NaT, index=df.index, dtype='datetime64[us]')
+    if 'Hora de Análisis' in df.columns:
+        key = parse_timestamps(df['Hora de Análisis']).astype('datetime64[us]')
+    if ' Date' in df.columns and 'Hora' in df.columns:
+        dates = pd.to_datetime(df[' Date'], errors='coerce').dt.normalize()
+        times = pd.to_timedelta(
+            df['Hora'].astype(object).map(lambda value: str(value).strip() if pd.notna(value) else None),
+            errors='coerce'
+        )
+        key = key.fillna((dates + times).astype('datetime64[us]'))
+    return key
+
+def current_history_file() -> str:
+    """The history to continue from: our own output when it exists, otherwise the original"""
+    return HISTORY_UPDATED_FILE if os.path.exists(HISTORY_UPDATED_FILE) else HISTORY_FILE
+
+def service_lock_holder() -> Optional[Dict[str, Any]]:
+    """Details of the ingest service holding the history, or None when no service is running"""
+    if not os.path.exists(SERVICE_LOCK_FILE):
+        return None
+    with open(SERVICE_LOCK_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+def check_no_service() -> None:
+    """Raise if an ingest service holds the history, since it would overwrite what we write"""
+    holder = service_lock_holder()
+    if holder is not None:
+        raise RuntimeError(
+            f"An ingest service (pid {holder.get('pid')}, {holder.get('address')}) holds the history; "
+            f"stop it first, or remove {SERVICE_LOCK_FILE} if it is no longer running"
+        )
+
+def merge_history(history_df: pd.DataFrame, new_rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge mapped report rows into the history in one pass.
+    
+    Rows are matched by analysis_timestamps(). Among new rows with the same
+    timestamp the most recently ingested one wins. A new row replaces the
+    history row with its timestamp, in that row's place, only when exactly
+    one history row has it; when the timestamp already repeats in the
+    history (e.g. end-of-day 00:00 readings recorded under the day they
+    close) no history row is removed and a warning is logged.
+    
+    Existing history rows are never reordered. The other new rows are
+    sorted and inserted after the last history row whose timestamp (or
+    that of a row before it) is not later than theirs; rows without a
+    timestamp go at the end.
+    
+    Args:
+        history_df: Current history
+        new_rows: Rows from map_filtered_rows(), oldest report first
         
-        logger.info(f"Original data shape before processing: {updated_df.shape}")
+    Returns:
+        Merged history dataframe
+    """
+    if new_rows.empty:
+        logger.info("No new rows to merge, history unchanged")
+        return history_df
+    
+    logger.info(f"Merging {len(new_rows)} rows into history of {len(history_df)} rows...")
+    history_key = analysis_timestamps(history_df).reset_index(drop=True)
+    new_rows = new_rows.reset_index(drop=True)
+    new_key = analysis_timestamps(new_rows)
+    
+    superseded = new_key.notna() & new_key.duplicated(keep='last')
+    order = new_key[~superseded].sort_values(kind='mergesort', na_position='last').index
+    new_rows, new_key = new_rows.loc[order], new_key.loc[order]
+    
+    counts = history_key.value_counts()
+    repeated = new_key.isin(counts.index[counts > 1])
+    if repeated.any():
+        logger.warning(
+            f"{repeated.sum()} new rows match a timestamp that repeats in the history "
+            f"(e.g. {new_key[repeated].iloc[0]}), keeping all of them"
+        )
+    unique_keys = history_key[history_key.map(counts) == 1]
+    replaced = new_key.map(pd.Series(unique_keys.index, index=unique_keys.to_numpy()))
+    
+    # Latest timestamp up to each history row; non-decreasing, so new rows can be placed by binary search
+    latest = history_key.ffill().cummax().fillna(pd.Timestamp.min)
+    inserted = pd.Series(len(history_key) - 0.5, index=new_key.index)
+    timed = new_key.notna()
+    inserted[timed] = latest.searchsorted(new_key[timed], side='right') - 0.5
+    
+    kept = ~history_key.index.isin(replaced.dropna())
+    positions = pd.concat([history_key.index[kept].to_series(), replaced.fillna(inserted)], ignore_index=True)
+    merged = _concat_history(history_df[kept.tolist()], new_rows)
+    merged = merged.loc[positions.sort_values(kind='mergesort').index].reset_index(drop=True)
+    
+    logger.info(
+        f"Replaced {replaced.notna().sum()} history rows, dropped {superseded.sum()} superseded new rows, "
+        f"merged history has {len(merged)} rows"
+    )
+    return merged
+
+def _write_time_cells(ws, export_df: pd.DataFrame) -> None:
+    """to_excel() writes datetime.time values as text; put them back as Excel times"""
+    for col_idx, col in enumerate(export_df.columns, start=1):
+        values = export_df[col]
+        if values.dtype != object:
+            continue
+        is_time = values.map(lambda value: isinstance(value, time)).to_numpy()
+        for row_idx in is_time.nonzero()[0]:
+            cell = ws.cell(row=row_idx + 2, column=col_idx)
+            cell.value = values.iat[row_idx]
+            cell.number_format = TIME_NUMBER_FORMAT
+
+def save_history(history_df: pd.DataFrame, path: str) -> None:
+    """Write the history dataframe to the 'datos' sheet of a workbook"""
+    logger.info(f"Saving updated data to: {path}")
+    export_df = to_export_frame(history_df)
+    with pd.ExcelWriter(path, engine='openpyxl', mode='w') as writer:
+        export_df.to_excel(writer, sheet_name='datos', index=False)
+        _write_time_cells(writer.sheets['datos'], export_df)
+
+def transfer_data(filtered_df: Optional[pd.DataFrame] = None) -> None:
+    logger.info("Starting data transfer from filtered to source file...")
+    log_variables(locals(), ['filtered_df'])
+    
+    try:
+        logger.debug(f"Column mapping: {COLUMN_MAPPING}")
+        check_no_service()
         
-        # Clean up the dataframe
-        initial_rows = len(updated_df)
-        updated_df = updated_df.dropna(how='all')
-        logger.info(f"Dropped {initial_rows - len(updated_df)} empty rows from original data")
-
-        # Process each row in the filtered data
-        logger.info("Processing filtered data rows...")
-        rows_added = 0
-        for idx, row in filtered_df.iterrows():
-            new_row = {}
-            logger.debug(f"Processing row {idx + 1}/{len(filtered_df)}")
-            
-            for target_col, source_col in column_mapping.items():
-                if target_col in row:
-                    val = row[target_col]
-                    if target_col == 'Hora de Análisis':
-                        logger.debug(f"Formatting datetime for column: {target_col}")
-                        formatted_val = format_datetime(val)
-                        logger.debug(f"Formatted datetime: {val} -> {formatted_val}")
-                        val = formatted_val
-                    new_row[source_col] = val
-            
-            logger.debug(f"Adding new row with data: {new_row}")
-            updated_df = pd.concat([updated_df, pd.DataFrame([new_row])], ignore_index=True)
-            rows_added += 1
+        # Continue from the history the service and backfill write, so their rows are kept
+        source_path = current_history_file()
+        updated_path = HISTORY_UPDATED_FILE
+        logger.info(f"Source file: {source_path}")
+        logger.info(f"Destination file: {updated_path}")
+
+        # Read filtered data unless the validation stage already handed it over
+        if filtered_df is None:
+            logger.info(f"Reading filtered data from: {FILTERED_FILE}")
+            filtered_df = pd.read_excel(FILTERED_FILE, sheet_name=FILTERED_SHEET)
+            logger.info(f"Read {len(filtered_df)} rows from filtered data")
         
-        logger.info(f"Added {rows_added} new rows to the data")
-        logger.info(f"Final data shape: {updated_df.shape}")
+        updated_df = load_history(source_path)
+        updated_df = append_filtered_rows(updated_df, filtered_df)
 
         # Save the updated data back to Excel
-        logger.info(f"Saving updated data to: {updated_path}")
-        with pd.ExcelWriter(updated_path, engine='openpyxl', mode='w') as writer:
-            updated_df.to_excel(writer, sheet_name='datos', index=False)
+        save_history(updated_df, updated_path)
         
         logger.info(f"Data transfer completed successfully. File saved at: {updated_path}")
         
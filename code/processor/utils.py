@@ -1,8 +1,10 @@
-from datetime import datetime, time, timedelta
+from datetime import datetime, date, time, timedelta
 import pandas as pd
 from typing import Optional, Dict, Any, List, Union, Tuple
 import inspect
+import os
 import re
+from functools import lru_cache
 from logger_config import setup_logger
 
 logger = setup_logger(__name__)
@@ -25,6 +27,35 @@ def log_variables(local_vars: Dict[str, Any], exclude: Optional[List[str]] = Non
     finally:
         del frame
 
+def report_paths(report_file: str) -> Dict[str, str]:
+    """Intermediate file paths for a daily report, named like the ones in config"""
+    base = os.path.splitext(report_file)[0]
+    return {
+        'updated': base + '_updated.xlsx',
+        'filtered': base + '_updated_filtered.xlsx',
+        'violations': base + '_violations.csv',
+    }
+
+def parse_header_date(value: Any) -> Optional[date]:
+    """
+    Parse a daily report header cell into a date.
+    Accepts date/datetime values and strings like "25-Apr-25".
+    
+    Returns:
+        date object or None if the cell does not hold a date
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            day, month, year = value.split('-')
+            return datetime.strptime(f"{day}-{month}-20{year}", '%d-%b-%Y').date()  # Assuming 2-digit year
+        except ValueError:
+            return None
+    return None
+
 def is_formula(value: Any) -> bool:
     """Check if the value is an Excel formula"""
     return isinstance(value, str) and value.startswith('=')
@@ -117,10 +148,13 @@ def format_datetime(value):
         logger.error(f"Unexpected error in format_datetime: {e}", exc_info=True)
         return value
 
+@lru_cache(maxsize=4096)
 def parse_time_string(time_val: Union[str, float, int]) -> Optional[time]:
     """
     Parse a time value into a time object.
     Handles Excel formulas, decimal hours, and various time string formats.
+    Results are cached, so a long-running process parses each distinct
+    value only once.
     
     Args:
         time_val: Time value to parse (string, float, or int)
@@ -217,6 +251,11 @@ def process_time_cells(worksheet, time_columns: List[int], rows_to_process: List
                     results['unchanged'] += 1
                     continue
                     
+                # Skip cells already combined into a datetime
+                if isinstance(cell.value, datetime):
+                    results['unchanged'] += 1
+                    continue
+                    
                 # Skip formula cells
                 if is_formula(cell.value):
                     results['skipped_formulas'] += 1
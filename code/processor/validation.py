@@ -0,0 +1,184 @@
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import inspect
+import os
+
+from config import FILTERED_FILE, VIOLATIONS_FILE, QUARANTINE_INVALID_ROWS
+from logger_config import setup_logger
+from processor.filtering import FILTERED_SHEET
+
+logger = setup_logger(__name__)
+
+OXIDE_COLUMNS = [
+    "SiO2", "Na2O", "CaO", "MgO", "Al2O3", "K2O", "SO3", "Fe2O3", "TiO2", "Cr2O3"
+]
+
+COUNT_COLUMNS = [
+    "Semillas L593", "Semillas L594", "Semillas (0 - 0,5) mm L 593",
+    "Semillas (0 - 0,5) mm L 594", "Burbujas (0,5-1) mm L 593",
+    "Burbujas (0,5-1) mm L 594", "Burbujas (>1)mm L 593", "Burbujas (>1)mm L 594",
+    "Burbujas por Kg - 593", "Burbujas por Kg - 594"
+]
+
+# Declarative rules evaluated column-wise over the filtered frame.
+# 'range': every listed column must fall inside [min, max] (either bound optional)
+# 'sum': the row sum of the listed columns must fall inside [min, max]; rows
+#        missing any of the columns (partial analyses) are not checked
+# 'not_greater': the first column must not exceed the second
+VALIDATION_RULES = [
+    {'name': 'oxide_sum', 'type': 'sum', 'columns': OXIDE_COLUMNS, 'min': 98.5, 'max': 101.5,
+     'message': 'Oxide sum is far from 100%'},
+    {'name': 'negative_count', 'type': 'range', 'columns': COUNT_COLUMNS, 'min': 0,
+     'message': 'Seed/bubble count is negative'},
+    {'name': 'redox_range', 'type': 'range', 'columns': ['Redox'], 'min': 0, 'max': 1,
+     'message': 'Redox out of range'},
+    {'name': 'feo_exceeds_fe2o3', 'type': 'not_greater', 'columns': ['%FeO as Fe2O3', 'Fe2O3'],
+     'message': '%FeO as Fe2O3 is greater than total Fe2O3'},
+]
+
+VIOLATION_COLUMNS = ['row', 'rule', 'column', 'value', 'message']
+
+def log_variables(local_vars: Dict[str, Any], exclude: Optional[List[str]] = None) -> None:
+    """Log variable names and their values"""
+    if exclude is None:
+        exclude = []
+    exclude.extend(['self', 'args', 'kwargs', 'exclude'])
+
+    frame = inspect.currentframe().f_back
+    try:
+        for var_name, var_value in frame.f_locals.items():
+            if var_name not in exclude:
+                logger.debug(f"Variable: {var_name} = {var_value!r}")
+    finally:
+        del frame
+
+def _check_range(numeric: pd.DataFrame, rule: Dict[str, Any]) -> List[Tuple[str, pd.Series, pd.Series]]:
+    results = []
+    for col in rule['columns']:
+        values = numeric[col]
+        mask = pd.Series(False, index=numeric.index)
+        if rule.get('min') is not None:
+            mask |= values < rule['min']
+        if rule.get('max') is not None:
+            mask |= values > rule['max']
+        results.append((col, mask, values))
+    return results
+
+def _check_sum(numeric: pd.DataFrame, rule: Dict[str, Any]) -> List[Tuple[str, pd.Series, pd.Series]]:
+    block = numeric[rule['columns']]
+    # Only complete analyses can be expected to add up
+    present = block.notna().all(axis=1)
+    total = block.sum(axis=1)
+    mask = present & ((total < rule['min']) | (total > rule['max']))
+    return [('+'.join(rule['columns']), mask, total)]
+
+def _check_not_greater(numeric: pd.DataFrame, rule: Dict[str, Any]) -> List[Tuple[str, pd.Series, pd.Series]]:
+    left, right = rule['columns']
+    mask = numeric[left] > numeric[right]
+    return [(left, mask, numeric[left])]
+
+RULE_CHECKS = {
+    'range': _check_range,
+    'sum': _check_sum,
+    'not_greater': _check_not_greater,
+}
+
+def validate_data(df: pd.DataFrame, rules: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+    """
+    Run validation rules over a filtered dataframe.
+
+    Args:
+        df: Filtered chemistry data, one row per analysis
+        rules: Rules to evaluate (defaults to VALIDATION_RULES)
+
+    Returns:
+        Violation table with one row per failed check. 'row' is the
+        spreadsheet row (header is row 1).
+    """
+    if rules is None:
+        rules = VALIDATION_RULES
+
+    needed = {col for rule in rules for col in rule['columns']}
+    numeric = pd.DataFrame(
+        {col: pd.to_numeric(df[col], errors='coerce') for col in needed if col in df.columns},
+        index=df.index
+    )
+
+    violations = []
+    for rule in rules:
+        missing = [col for col in rule['columns'] if col not in numeric.columns]
+        if missing and rule['type'] == 'range' and len(missing) < len(rule['columns']):
+            # Range checks are per column, so run them on the columns that exist
+            logger.warning(f"Rule '{rule['name']}' columns not found: {', '.join(missing)}")
+            rule = {**rule, 'columns': [col for col in rule['columns'] if col in numeric.columns]}
+        elif missing:
+            logger.warning(f"Skipping rule '{rule['name']}', columns not found: {', '.join(missing)}")
+            continue
+
+        for col, mask, values in RULE_CHECKS[rule['type']](numeric, rule):
+            failed = mask.fillna(False).to_numpy(dtype=bool)
+            if not failed.any():
+                continue
+            logger.debug(f"Rule '{rule['name']}' failed on {failed.sum()} rows of column '{col}'")
+            violations.append(pd.DataFrame({
+                'row': df.index[failed] + 2,
+                'rule': rule['name'],
+                'column': col,
+                'value': values.to_numpy()[failed],
+                'message': rule['message'],
+            }))
+
+    if not violations:
+        return pd.DataFrame(columns=VIOLATION_COLUMNS)
+    return pd.concat(violations, ignore_index=True).sort_values(['row', 'rule'], kind='mergesort', ignore_index=True)
+
+def validate_filtered_data(filtered_df: Optional[pd.DataFrame] = None,
+                           quarantine: bool = QUARANTINE_INVALID_ROWS,
+                           violations_file: str = VIOLATIONS_FILE) -> pd.DataFrame:
+    """
+    Validation stage between filter_columns() and transfer_data().
+
+    Args:
+        filtered_df: Filtered data; read from FILTERED_FILE when not given
+        quarantine: Drop rows with violations so they are not appended
+        violations_file: Where to write the violation table
+
+    Returns:
+        The rows to hand over to transfer_data()
+    """
+    logger.info("Validating filtered data...")
+    log_variables(locals(), ['filtered_df'])
+
+    try:
+        if filtered_df is None:
+            logger.info(f"Reading filtered data from: {FILTERED_FILE}")
+            filtered_df = pd.read_excel(FILTERED_FILE, sheet_name=FILTERED_SHEET)
+
+        start_time = datetime.now()
+        violations = validate_data(filtered_df)
+        duration = (datetime.now() - start_time).total_seconds()
+
+        bad_rows = violations['row'].nunique()
+        logger.info(
+            f"Validation completed in {duration * 1000:.1f} ms. "
+            f"Rows: {len(filtered_df)}, Violations: {len(violations)}, Rows with violations: {bad_rows}"
+        )
+
+        if len(violations):
+            logger.info(f"Saving violation table to {violations_file}")
+            violations.to_csv(violations_file, index=False, encoding='utf-8-sig')
+        elif os.path.exists(violations_file):
+            # Do not leave a table from an earlier run next to a clean report
+            os.remove(violations_file)
+
+        if quarantine and bad_rows:
+            rejected = filtered_df.index.isin(violations['row'] - 2)
+            logger.warning(f"Quarantined {rejected.sum()} rows, they will not be transferred")
+            filtered_df = filtered_df[~rejected]
+
+        return filtered_df
+
+    except Exception as e:
+        logger.error(f"Error in validate_filtered_data: {str(e)}", exc_info=True)
+        raise
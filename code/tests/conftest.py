@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The processor modules import `config` and `processor.*` from the code directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
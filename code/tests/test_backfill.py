@@ -0,0 +1,107 @@
+import json
+import os
+from datetime import time
+
+import pandas as pd
+import pytest
+
+import processor.backfill as backfill_module
+import processor.transferring as transferring_module
+from processor.backfill import backfill
+from processor.transferring import save_history
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    history_file = str(tmp_path / 'history.xlsx')
+    updated_file = str(tmp_path / 'history_updated.xlsx')
+    lock_file = str(tmp_path / 'service.lock')
+    monkeypatch.setattr(transferring_module, 'HISTORY_FILE', history_file)
+    monkeypatch.setattr(transferring_module, 'HISTORY_UPDATED_FILE', updated_file)
+    monkeypatch.setattr(backfill_module, 'HISTORY_UPDATED_FILE', updated_file)
+    monkeypatch.setattr(backfill_module, 'BACKFILL_CHECKPOINT_FILE', str(tmp_path / 'checkpoint.json'))
+    monkeypatch.setattr(backfill_module, 'BACKFILL_ROWS_DIR', str(tmp_path / 'rows'))
+    monkeypatch.setattr(backfill_module, 'BACKFILL_REJECTED_FILE', str(tmp_path / 'rejected.csv'))
+    monkeypatch.setattr(transferring_module, 'SERVICE_LOCK_FILE', lock_file)
+
+    save_history(pd.DataFrame({
+        ' Date': pd.to_datetime(['2025-05-01', '2025-05-01']),
+        'Hora': [time(6, 0), time(8, 0)],
+        'Pureza': [1.0, 2.0],
+    }), history_file)
+
+    for day in (2, 3, 1):
+        (tmp_path / f'report_{day}.xlsx').touch()
+    return tmp_path
+
+def fake_collect(calls, fail_on=None):
+    def collect(report):
+        calls.append(os.path.basename(report))
+        if report.endswith(f'{fail_on}.xlsx'):
+            raise RuntimeError('interrupted')
+        day = int(report[-6])
+        return pd.DataFrame({
+            'Hora de Análisis': [f'0{day}/05/2025 08:00:00', f'0{day}/05/2025 10:00:00'],
+            'Pureza': [10.0 * day, 10.0 * day + 1],
+        })
+    return collect
+
+def read_updated(tmp_path):
+    return pd.read_excel(tmp_path / 'history_updated.xlsx', sheet_name='datos')
+
+def test_backfill_resumes_after_interruption(workspace, monkeypatch):
+    calls = []
+    monkeypatch.setattr(backfill_module, '_collect_report', fake_collect(calls, fail_on='report_3'))
+    with pytest.raises(RuntimeError):
+        backfill([str(workspace / 'report_*.xlsx')])
+    assert calls == ['report_1.xlsx', 'report_2.xlsx', 'report_3.xlsx']
+    assert len(os.listdir(workspace / 'rows')) == 2
+
+    calls.clear()
+    monkeypatch.setattr(backfill_module, '_collect_report', fake_collect(calls))
+    backfill([str(workspace / 'report_*.xlsx')])
+    assert calls == ['report_3.xlsx']
+
+    history = read_updated(workspace)
+    # The 01/05 08:00 report row replaces the history row with the same ' Date' + 'Hora'
+    assert history['Pureza'].tolist() == [1.0, 10.0, 11.0, 20.0, 21.0, 30.0, 31.0]
+    assert not os.path.exists(workspace / 'checkpoint.json')
+    assert not os.path.exists(workspace / 'rows')
+
+def test_backfill_quarantines_unparseable_timestamps(workspace, monkeypatch):
+    def collect(report):
+        return pd.DataFrame({'Hora de Análisis': ['02/05/2025 08:00:00', 'sin hora'], 'Pureza': [5.0, 6.0]})
+    monkeypatch.setattr(backfill_module, '_collect_report', collect)
+    backfill([str(workspace / 'report_1.xlsx')])
+
+    assert read_updated(workspace)['Pureza'].tolist() == [1.0, 2.0, 5.0]
+    assert pd.read_csv(workspace / 'rejected.csv')['Hora de Análisis'].tolist() == ['sin hora']
+
+def test_backfill_continues_from_service_output(workspace, monkeypatch):
+    save_history(pd.DataFrame({'Hora de Análisis': ['04/05/2025 08:00:00'], 'Pureza': [4.0]}),
+                 str(workspace / 'history_updated.xlsx'))
+    monkeypatch.setattr(backfill_module, '_collect_report', fake_collect([]))
+    backfill([str(workspace / 'report_1.xlsx')])
+    assert read_updated(workspace)['Pureza'].tolist() == [10.0, 11.0, 4.0]
+
+def test_backfill_refuses_while_service_holds_history(workspace, monkeypatch):
+    with open(workspace / 'service.lock', 'w', encoding='utf-8') as f:
+        json.dump({'pid': 1234, 'address': '127.0.0.1:8765'}, f)
+    calls = []
+    monkeypatch.setattr(backfill_module, '_collect_report', fake_collect(calls))
+    with pytest.raises(RuntimeError, match='pid 1234'):
+        backfill([str(workspace / 'report_*.xlsx')])
+    assert calls == []
+    assert not os.path.exists(workspace / 'history_updated.xlsx')
+
+def test_backfill_without_rows_leaves_history_alone(workspace, monkeypatch):
+    monkeypatch.setattr(backfill_module, '_collect_report', lambda report: pd.DataFrame())
+    backfill([str(workspace / 'report_*.xlsx')])
+    assert not os.path.exists(workspace / 'history_updated.xlsx')
+    assert not os.path.exists(workspace / 'checkpoint.json')
+
+def test_backfill_without_timestamps_adds_no_timestamp_column(workspace, monkeypatch):
+    monkeypatch.setattr(backfill_module, '_collect_report', lambda report: pd.DataFrame({'Pureza': [7.0]}))
+    backfill([str(workspace / 'report_1.xlsx')])
+    history = read_updated(workspace)
+    assert 'Hora de Análisis' not in history.columns
+    assert history['Pureza'].tolist() == [1.0, 2.0, 7.0]
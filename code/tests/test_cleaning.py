@@ -0,0 +1,53 @@
+import os
+
+import pytest
+from openpyxl import load_workbook
+from openpyxl.workbook.workbook import Workbook
+
+import processor.templates as templates_module
+from processor.cleaning import clean_daily_excel
+from processor.templates import fingerprint_template
+
+SAMPLE_REPORT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'data', 'A-INFORME QUÍMICO DIARIO 2025 Macro prueba.xlsx'
+)
+
+pytestmark = pytest.mark.skipif(not os.path.exists(SAMPLE_REPORT), reason="sample daily report not available")
+
+@pytest.fixture
+def plans_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'plans.json')
+    monkeypatch.setattr(templates_module, 'TEMPLATE_PLANS_FILE', path)
+    monkeypatch.setattr(templates_module, '_plans', None)
+    return path
+
+def sheet_values(path):
+    return list(load_workbook(path).active.iter_rows(values_only=True))
+
+def test_plan_replay_matches_discovery(tmp_path, plans_file):
+    discovered = str(tmp_path / 'discovered.xlsx')
+    replayed = str(tmp_path / 'replayed.xlsx')
+
+    discovery_changes = clean_daily_excel(SAMPLE_REPORT, discovered)
+    assert os.path.exists(plans_file)
+
+    fingerprint = fingerprint_template(load_workbook(SAMPLE_REPORT).active)
+    assert templates_module.load_cleaning_plan(fingerprint) is not None
+
+    replay_changes = clean_daily_excel(SAMPLE_REPORT, replayed)
+    assert replay_changes == discovery_changes
+    assert sheet_values(replayed) == sheet_values(discovered)
+
+def test_cleaning_a_cleaned_report_changes_nothing(tmp_path, plans_file, monkeypatch):
+    cleaned = str(tmp_path / 'cleaned.xlsx')
+    again = str(tmp_path / 'again.xlsx')
+    clean_daily_excel(SAMPLE_REPORT, cleaned)
+
+    saved = []
+    monkeypatch.setattr(Workbook, 'save', lambda wb, filename: saved.append(filename))
+    assert clean_daily_excel(cleaned, again) == {'cells': 0, 'merges': 0, 'widths': 0}
+    assert saved == []
+    # The unchanged report is copied, so the filter stage still finds it
+    with open(cleaned, 'rb') as f, open(again, 'rb') as g:
+        assert f.read() == g.read()
@@ -0,0 +1,97 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import processor.service as service_module
+import processor.transferring as transferring_module
+from processor.filtering import FILTERED_SHEET
+from processor.service import IngestService, acquire_service_lock, release_service_lock
+from processor.transferring import save_history, transfer_data
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    history_file = str(tmp_path / 'history.xlsx')
+    updated_file = str(tmp_path / 'history_updated.xlsx')
+    lock_file = str(tmp_path / 'service.lock')
+    monkeypatch.setattr(transferring_module, 'HISTORY_FILE', history_file)
+    monkeypatch.setattr(transferring_module, 'HISTORY_UPDATED_FILE', updated_file)
+    monkeypatch.setattr(transferring_module, 'SERVICE_LOCK_FILE', lock_file)
+    monkeypatch.setattr(service_module, 'HISTORY_UPDATED_FILE', updated_file)
+    monkeypatch.setattr(service_module, 'SERVICE_LOCK_FILE', lock_file)
+
+    save_history(pd.DataFrame({'Hora de Análisis': ['01/05/2025 06:00:00'], 'Pureza': [1.0]}), history_file)
+
+    # Cleaning is covered elsewhere; here the report's filtered sheet is written directly
+    monkeypatch.setattr(service_module, 'clean_daily_excel',
+                        lambda source, updated: {'cells': 1, 'merges': 0, 'widths': 0})
+    return tmp_path
+
+def make_report(tmp_path, name, rows):
+    def filter_columns(updated_file, filtered_file):
+        pd.DataFrame(rows).to_excel(filtered_file, sheet_name=FILTERED_SHEET, index=False)
+    return str(tmp_path / name), filter_columns
+
+def read_updated(tmp_path):
+    return pd.read_excel(tmp_path / 'history_updated.xlsx', sheet_name='datos')
+
+def test_ingest_flush_and_stop(workspace, monkeypatch):
+    service = IngestService(flush_interval=0)
+    assert service.flush() is False
+
+    report, filter_columns = make_report(workspace, 'report_2.xlsx', {
+        'Hora de Análisis': ['02/05/2025 06:00:00', '02/05/2025 08:00:00'],
+        'Saturación (%) (Pureza)': [2.0, 3.0],
+    })
+    monkeypatch.setattr(service_module, 'filter_columns', filter_columns)
+    result = service.ingest(report)
+    assert result['rows_added'] == 2
+    assert service.status()['dirty'] is True
+
+    assert service.flush() is True
+    assert read_updated(workspace)['Pureza'].tolist() == [1.0, 2.0, 3.0]
+    assert service.flush() is False
+
+    report, filter_columns = make_report(workspace, 'report_3.xlsx', {
+        'Hora de Análisis': ['03/05/2025 06:00:00'], 'Saturación (%) (Pureza)': [4.0],
+    })
+    monkeypatch.setattr(service_module, 'filter_columns', filter_columns)
+    service.ingest(report)
+    service.stop()
+    assert read_updated(workspace)['Pureza'].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+def test_ingest_without_rows_does_not_dirty_history(workspace, monkeypatch):
+    service = IngestService(flush_interval=0)
+    report, filter_columns = make_report(workspace, 'empty.xlsx', {
+        'Hora de Análisis': [], 'Saturación (%) (Pureza)': [],
+    })
+    monkeypatch.setattr(service_module, 'filter_columns', filter_columns)
+
+    assert service.ingest(report)['rows_added'] == 0
+    assert service.status()['dirty'] is False
+    service.stop()
+    assert not os.path.exists(workspace / 'history_updated.xlsx')
+
+def test_service_resumes_from_its_own_output(workspace):
+    save_history(pd.DataFrame({'Pureza': [1.0, 2.0]}), str(workspace / 'history_updated.xlsx'))
+    assert len(IngestService(flush_interval=0).history_df) == 2
+
+def test_lock_refuses_second_service(workspace):
+    acquire_service_lock('127.0.0.1', 8765)
+    with pytest.raises(RuntimeError, match='127.0.0.1:8765'):
+        acquire_service_lock('127.0.0.1', 8766)
+    release_service_lock()
+    assert not os.path.exists(workspace / 'service.lock')
+
+def test_transfer_data_continues_from_service_output(workspace):
+    save_history(pd.DataFrame({'Pureza': [1.0, 2.0]}), str(workspace / 'history_updated.xlsx'))
+    transfer_data(pd.DataFrame({'Saturación (%) (Pureza)': [3.0]}))
+    assert read_updated(workspace)['Pureza'].tolist() == [1.0, 2.0, 3.0]
+
+def test_transfer_data_refuses_while_service_holds_history(workspace):
+    with open(workspace / 'service.lock', 'w', encoding='utf-8') as f:
+        json.dump({'pid': 1234, 'address': '127.0.0.1:8765'}, f)
+    with pytest.raises(RuntimeError, match='pid 1234'):
+        transfer_data(pd.DataFrame({'Saturación (%) (Pureza)': [3.0]}))
+    assert not os.path.exists(workspace / 'history_updated.xlsx')
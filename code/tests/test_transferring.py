@@ -0,0 +1,84 @@
+from datetime import time
+
+import pandas as pd
+
+from processor.transferring import (
+    analysis_timestamps, coerce_history_dtypes, load_history, merge_history, save_history
+)
+
+def history_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        ' Date': pd.to_datetime(['2025-05-06', '2025-05-06', None, '2025-05-07']),
+        'Hora': [time(6, 0), ' 14:00:00', None, time(6, 0)],
+        'Pureza': [3.8929276869869, 4.1, None, 4.2],
+    })
+
+def report_rows(*stamps: str, pureza: float = 9.9) -> pd.DataFrame:
+    return pd.DataFrame({'Hora de Análisis': list(stamps), 'Pureza': [pureza] * len(stamps)})
+
+def test_history_key_combines_date_and_hora():
+    key = analysis_timestamps(history_frame())
+    assert key.tolist()[:2] == [pd.Timestamp('2025-05-06 06:00'), pd.Timestamp('2025-05-06 14:00')]
+    assert pd.isna(key[2])
+
+def test_merge_replaces_history_row_with_same_timestamp():
+    merged = merge_history(history_frame(), report_rows('06/05/2025 14:00:00', '07/05/2025 08:00:00'))
+    # The replaced row keeps its place; the other new row goes after its predecessor
+    assert merged['Pureza'].fillna(0).round(2).tolist() == [3.89, 9.9, 0, 4.2, 9.9]
+    assert analysis_timestamps(merged).dropna().is_unique
+
+def test_merge_keeps_keyless_rows_after_their_predecessor():
+    merged = merge_history(history_frame(), report_rows('06/05/2025 20:00:00'))
+    key = analysis_timestamps(merged)
+    assert key[1] == pd.Timestamp('2025-05-06 14:00')
+    assert pd.isna(key[2])
+    assert key[3] == pd.Timestamp('2025-05-06 20:00')
+
+def end_of_day_history() -> pd.DataFrame:
+    # The Datos sheet records the midnight reading that closes a day as Date=D, Hora=00:00
+    return pd.DataFrame({
+        ' Date': pd.to_datetime(['2025-04-01', '2025-04-01', '2025-04-02', '2025-04-02', '2025-04-02']),
+        'Hora': [time(12, 0), time(0, 0), time(0, 0), time(12, 0), time(0, 0)],
+        'Pureza': [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+
+def test_merge_keeps_history_rows_when_key_repeats(caplog):
+    merged = merge_history(end_of_day_history(), report_rows('02/04/2025 00:00:00'))
+    # Both 02/04 00:00 history rows stay; the new row follows the latest earlier reading
+    assert merged['Pureza'].tolist() == [1.0, 2.0, 3.0, 9.9, 4.0, 5.0]
+    assert 'repeats in the history' in caplog.text
+
+def test_merge_does_not_reorder_history():
+    merged = merge_history(end_of_day_history(), report_rows('01/04/2025 12:00:00', '02/04/2025 06:00:00'))
+    # 01/04 12:00 is unique and replaced in place; 02/04 06:00 goes after the latest earlier reading
+    assert merged['Pureza'].tolist() == [9.9, 2.0, 3.0, 9.9, 4.0, 5.0]
+
+def test_merge_without_new_rows_returns_history():
+    history = end_of_day_history()
+    assert merge_history(history, report_rows()) is history
+
+def test_merge_tolerates_unparseable_timestamps():
+    merged = merge_history(history_frame(), report_rows('not a date', '07/05/2025 08:00:00'))
+    assert len(merged) == 6
+
+def test_coerce_keeps_times_and_precise_floats():
+    df = coerce_history_dtypes(history_frame())
+    assert df['Hora'].dtype == object
+    assert df['Pureza'].dtype == 'float64'
+    assert coerce_history_dtypes(pd.DataFrame({'SiO2': [72.419, 71.5]}))['SiO2'].dtype == 'float32'
+
+def test_coerce_parses_decimal_comma_text():
+    df = coerce_history_dtypes(pd.DataFrame({'%T 550nm (2mm)': [63.954188758712924, '38,146\n', None]}))
+    assert df['%T 550nm (2mm)'].dtype == 'float64'
+    assert df['%T 550nm (2mm)'].tolist()[:2] == [63.954188758712924, 38.146]
+    assert coerce_history_dtypes(pd.DataFrame({'Dia': ['mon', 'tue'] * 3}))['Dia'].dtype == 'category'
+
+def test_save_load_round_trip_keeps_values(tmp_path):
+    path = str(tmp_path / 'history.xlsx')
+    save_history(coerce_history_dtypes(history_frame()), path)
+    back = pd.read_excel(path, sheet_name='datos')
+    assert back['Hora'].iloc[0] == time(6, 0)
+    assert back['Pureza'].iloc[0] == 3.8929276869869
+
+    reloaded = load_history(path)
+    assert reloaded['Pureza'].iloc[0] == 3.8929276869869
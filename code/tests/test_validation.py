@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+
+from processor.validation import OXIDE_COLUMNS, validate_data, validate_filtered_data
+
+def oxide_row(total: float = 100.0) -> dict:
+    # SiO2 takes whatever the other oxides leave to reach the total
+    row = {col: 1.0 for col in OXIDE_COLUMNS}
+    row['SiO2'] = total - (len(OXIDE_COLUMNS) - 1)
+    return row
+
+def test_clean_rows_have_no_violations():
+    df = pd.DataFrame([oxide_row(), oxide_row(99.0)])
+    assert validate_data(df).empty
+
+def test_each_rule_reports_spreadsheet_row():
+    df = pd.DataFrame([
+        oxide_row(),
+        oxide_row(95.0),
+        {**oxide_row(), 'Redox': 1.5},
+        {**oxide_row(), 'Semillas L593': -1},
+        {**oxide_row(), '%FeO as Fe2O3': 2.0},
+    ])
+    violations = validate_data(df)
+    assert violations[['row', 'rule']].values.tolist() == [
+        [3, 'oxide_sum'], [4, 'redox_range'], [5, 'negative_count'], [6, 'feo_exceeds_fe2o3']
+    ]
+
+def test_partial_oxide_analysis_is_not_summed():
+    partial = oxide_row()
+    partial['Cr2O3'] = None
+    assert validate_data(pd.DataFrame([partial])).empty
+
+def test_range_rule_runs_on_columns_present():
+    df = pd.DataFrame({'Semillas L593': [1, -2]})
+    violations = validate_data(df)
+    assert violations['rule'].tolist() == ['negative_count']
+    assert violations['row'].tolist() == [3]
+
+def test_quarantine_drops_rows_and_writes_table(tmp_path):
+    violations_file = str(tmp_path / 'violations.csv')
+    df = pd.DataFrame([oxide_row(), oxide_row(90.0), oxide_row()])
+
+    kept = validate_filtered_data(df, quarantine=True, violations_file=violations_file)
+    assert kept.index.tolist() == [0, 2]
+    assert pd.read_csv(violations_file)['row'].tolist() == [3]
+
+    # A clean run removes the table left by the previous one
+    validate_filtered_data(kept, quarantine=True, violations_file=violations_file)
+    assert not os.path.exists(violations_file)